@@ -1,16 +1,17 @@
 import argparse
+import concurrent.futures
 import configparser
-import hashlib
-import json
 import os
 import os.path
 import re
 import tarfile
+import threading
 import traceback
+import urllib.error
 import urllib.parse
 import urllib.request
 import zipfile
-from typing import Dict, Iterable, Tuple
+from typing import Any, Dict, Iterable, Tuple
 
 import packaging.requirements
 import packaging.specifiers
@@ -20,10 +21,32 @@ import packaging.version
 
 from morgan import configurator, metadata, server
 from morgan.__about__ import __version__
-from morgan.utils import to_single_dash
+from morgan.cache import HTTPCache
+from morgan.utils import file_digest, to_single_dash
+
+try:
+    # orjson is an optional dependency, its parser is considerably faster than
+    # the standard library's for the large JSON documents the Simple API
+    # returns for popular projects
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+
+    _json_loads = json.loads
+
+try:
+    # urllib3 is an optional dependency, used to keep connections to the index
+    # alive between requests
+    import urllib3
+except ImportError:
+    urllib3 = None
 
 PYPI_ADDRESS = "https://pypi.org/simple/"
 PREFERRED_HASH_ALG = "sha256"
+HTTP_CACHE_FILENAME = ".morgan-cache.sqlite3"
+PREFETCH_WORKERS = 16
 
 
 class Mirrorer:
@@ -66,8 +89,28 @@ class Mirrorer:
                     )
                 )
 
+        # results of matching platform tags against the patterns above, kept
+        # by tag, as the same few tags appear on most wheels
+        self._platform_matches: Dict[str, bool] = {}
+
         self._processed_pkgs = {}
 
+        # prefetched project pages are kept in memory until they are mirrored,
+        # and optionally on disk across runs (via http_cache) so they can be
+        # revalidated with conditional requests
+        self._project_pages = {}
+        self._prefetch_errors: Dict[str, Exception] = {}
+        self._project_pages_lock = threading.Lock()
+        self.http_cache: HTTPCache = None
+
+        # urllib picks up proxy (and proxy bypass) settings when the opener is
+        # built. urllib3 does not honor them, so it is only used when no proxy
+        # is configured.
+        self._opener = urllib.request.build_opener()
+        self._http = None
+        if urllib3 is not None and not urllib.request.getproxies():
+            self._http = urllib3.PoolManager(num_pools=4, maxsize=PREFETCH_WORKERS)
+
     def mirror(self, requirement_string: str):
         """
         Mirror a package according to a PEP 508-compliant requirement string.
@@ -87,6 +130,13 @@ class Mirrorer:
             return
 
         while len(deps) > 0:
+            # dependencies that were already mirrored will not take their
+            # pages, so they must not be prefetched
+            self._prefetch_projects(
+                dep
+                for dep in deps
+                if str(deps[dep]["requirement"]) not in self._processed_pkgs
+            )
             next_deps = {}
             for dep in deps:
                 more_deps = self._mirror(
@@ -97,6 +147,30 @@ class Mirrorer:
                     next_deps.update(more_deps)
             deps = next_deps.copy()
 
+    def prewarm(self):
+        """
+        Fetch the Simple API pages of all packages listed in the requirements
+        section of the configuration concurrently, so that mirroring them
+        afterwards is served from memory. Pages that are already prefetched
+        are not requested again.
+        """
+
+        self._prefetch_projects(
+            packaging.utils.canonicalize_name(package)
+            for package in self.config["requirements"]
+        )
+
+    def close(self):
+        """
+        Release resources held by the mirrorer, such as the HTTP cache.
+        """
+
+        if self.http_cache is not None:
+            self.http_cache.close()
+            self.http_cache = None
+        if self._http is not None:
+            self._http.clear()
+
     def copy_server(self):
         """
         Copy the server script to the package index. This method will first
@@ -131,19 +205,7 @@ class Mirrorer:
         else:
             print("{}".format(requirement))
 
-        data: dict = None
-
-        # get information about this package from the Simple API in JSON
-        # format as per PEP 691
-        request = urllib.request.Request(
-            "{}{}/".format(self.index_url, requirement.name),
-            headers={
-                "Accept": "application/vnd.pypi.simple.v1+json",
-            },
-        )
-
-        with urllib.request.urlopen(request) as response:
-            data = json.load(response)
+        data = self._take_project(requirement.name)
 
         # check metadata version ~1.0
         v_str = data["meta"]["api-version"]
@@ -188,6 +250,119 @@ class Mirrorer:
 
         return depdict
 
+    def _take_project(self, name: str) -> dict:
+        """
+        Returns the parsed Simple API page of a package, either as prefetched
+        by _prefetch_projects, or fetched now. Prefetched pages are held as raw
+        JSON, which is much smaller than its parsed form, and dropped from
+        memory once taken. If prefetching the page failed, the error is raised
+        here instead of requesting the page again.
+        """
+
+        with self._project_pages_lock:
+            body = self._project_pages.pop(name, None)
+            err = self._prefetch_errors.pop(name, None)
+        if err is not None:
+            raise err
+        if body is None:
+            body = self._fetch_project(name)
+        return _json_loads(body)
+
+    def _fetch_project(self, name: str) -> bytes:
+        """
+        Get information about a package from the Simple API in JSON format as
+        per PEP 691, returning the unparsed response body. Responses are
+        persisted to the HTTP cache (if enabled) so that later runs only need
+        to revalidate them.
+        """
+
+        url = "{}{}/".format(self.index_url, name)
+        headers = {
+            "Accept": "application/vnd.pypi.simple.v1+json",
+        }
+
+        cached = None
+        if self.http_cache is not None:
+            cached = self.http_cache.get(url)
+        if cached is not None:
+            (etag, last_modified, _) = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        try:
+            (body, response_headers) = self._get(url, headers)
+            if self.http_cache is not None:
+                self.http_cache.put(
+                    url,
+                    response_headers.get("ETag"),
+                    response_headers.get("Last-Modified"),
+                    body,
+                )
+        except urllib.error.HTTPError as err:
+            if err.code != 304 or cached is None:
+                raise
+            body = cached[2]
+
+        return body
+
+    def _get(self, url: str, headers: Dict[str, str] = None) -> Tuple[bytes, Any]:
+        """
+        Perform a GET request, returning the body and headers of the response.
+        When urllib3 is available and no proxy is configured, connections are
+        pooled so that consecutive requests to the same host reuse the TCP
+        connection and TLS session; otherwise urllib is used. In both cases,
+        error responses (including "304 Not Modified") raise
+        urllib.error.HTTPError.
+        """
+
+        if self._http is not None:
+            response = self._http.request("GET", url, headers=headers)
+            if response.status >= 300:
+                raise urllib.error.HTTPError(
+                    url, response.status, response.reason, response.headers, None
+                )
+            return (response.data, response.headers)
+
+        request = urllib.request.Request(url, headers=headers or {})
+        with self._opener.open(request) as response:
+            return (response.read(), response.headers)
+
+    def _prefetch_projects(self, names: Iterable[str]):
+        """
+        Fetch the Simple API pages of several packages concurrently, so that
+        mirroring them afterwards does not wait on one round trip per package.
+        Errors are recorded rather than raised, and will be raised by
+        _take_project when the package itself is mirrored.
+        """
+
+        with self._project_pages_lock:
+            names = [
+                name
+                for name in names
+                if name not in self._project_pages and name not in self._prefetch_errors
+            ]
+        if len(names) < 2:
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(PREFETCH_WORKERS, len(names))
+        ) as executor:
+            futures = {
+                executor.submit(self._fetch_project, name): name for name in names
+            }
+            for future in concurrent.futures.as_completed(futures):
+                name = futures[future]
+                try:
+                    data = future.result()
+                except Exception as err:
+                    with self._project_pages_lock:
+                        self._prefetch_errors[name] = err
+                else:
+                    with self._project_pages_lock:
+                        self._project_pages[name] = data
+
     def _filter_files(
         self,
         requirement: packaging.requirements.Requirement,
@@ -315,19 +490,24 @@ class Mirrorer:
                 if intrp_ver and intrp_ver != "3" and not intrp_ver_matched:
                     continue
 
-                if tag.platform == "any":
+                if tag.platform == "any" or self._matches_platforms(tag.platform):
+                    # tag matched, accept this file
                     return True
-                else:
-                    for platformre in self._supported_platforms:
-                        if platformre.fullmatch(tag.platform):
-                            # tag matched, accept this file
-                            return True
 
             # none of the tags matched, reject this file
             return False
 
         return True
 
+    def _matches_platforms(self, platform: str) -> bool:
+        matched = self._platform_matches.get(platform)
+        if matched is None:
+            matched = self._platform_matches[platform] = any(
+                platformre.fullmatch(platform)
+                for platformre in self._supported_platforms
+            )
+        return matched
+
     def _process_file(
         self,
         requirement: packaging.requirements.Requirement,
@@ -340,7 +520,8 @@ class Mirrorer:
             else fileinfo["hashes"].keys()[0]
         )
 
-        self._download_file(fileinfo, filepath, hashalg)
+        if not self._download_file(fileinfo, filepath, hashalg):
+            return None
 
         md = self._extract_metadata(filepath, requirement.name, fileinfo["version"])
 
@@ -369,35 +550,40 @@ class Mirrorer:
 
         # if target already exists, verify its hash and only download if
         # there's a mismatch
-        if os.path.exists(target):
-            truehash = self._hash_file(target, hashalg)
-            if truehash == exphash:
+        try:
+            if self._hash_file(target, hashalg) == exphash:
                 return True
+        except FileNotFoundError:
+            pass
 
         print("\t{}...".format(fileinfo["url"]), end=" ")
-        with urllib.request.urlopen(fileinfo["url"]) as inp, open(target, "wb") as out:
-            out.write(inp.read())
+        (body, _) = self._get(fileinfo["url"])
+        with open(target, "wb") as out:
+            out.write(body)
         print("done")
 
         truehash = self._hash_file(target, hashalg)
         if truehash != exphash:
-            raise Exception("Digest mismatch for {}".format(fileinfo["filename"]))
+            print("\tDigest mismatch for {}, skipping it".format(fileinfo["filename"]))
+            # don't leave the file behind, the server would serve it along
+            # with the hash that was just recorded for it
+            for path in (target, "{}.hash".format(target)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            return False
 
         return True
 
     def _hash_file(self, filepath: str, hashalg: str) -> str:
-        contents = None
-        with open(filepath, "rb") as fh:
-            # verify downloaded file has same hash
-            contents = fh.read()
-
-        truehash = hashlib.new(hashalg)
-        truehash.update(contents)
+        # verify downloaded file has same hash
+        truehash = file_digest(filepath, hashalg)
 
         with open("{}.hash".format(filepath), "w") as out:
-            out.write("{}={}".format(hashalg, truehash.hexdigest()))
+            out.write("{}={}".format(hashalg, truehash))
 
-        return truehash.hexdigest()
+        return truehash
 
     def _extract_metadata(
         self,
@@ -477,21 +663,29 @@ def mirror(args: argparse.Namespace):
     """
 
     m = Mirrorer(args)
-    for package in m.config["requirements"]:
-        reqs = m.config["requirements"][package].splitlines()
-        if not reqs:
-            # empty requirements
-            # morgan =
-            m.mirror(f"{package}")
-        else:
-            # multiline requirements
-            # urllib3 =
-            #   <1.27
-            #   >=2
-            #   [brotli]
-            for req in reqs:
-                req = req.strip()
-                m.mirror(f"{package}{req}")
+    if not args.no_http_cache:
+        os.makedirs(args.index_path, exist_ok=True)
+        m.http_cache = HTTPCache(os.path.join(args.index_path, HTTP_CACHE_FILENAME))
+
+    try:
+        m.prewarm()
+        for package in m.config["requirements"]:
+            reqs = m.config["requirements"][package].splitlines()
+            if not reqs:
+                # empty requirements
+                # morgan =
+                m.mirror(f"{package}")
+            else:
+                # multiline requirements
+                # urllib3 =
+                #   <1.27
+                #   >=2
+                #   [brotli]
+                for req in reqs:
+                    req = req.strip()
+                    m.mirror(f"{package}{req}")
+    finally:
+        m.close()
 
     if not args.skip_server_copy:
         m.copy_server()
@@ -544,6 +738,12 @@ def main():
         action="store_true",
         help="Skip server copy in mirror command (default: False)",
     )
+    parser.add_argument(
+        "--no-http-cache",
+        dest="no_http_cache",
+        action="store_true",
+        help="Do not cache index responses between mirror runs (default: False)",
+    )
 
     server.add_arguments(parser)
     configurator.add_arguments(parser)
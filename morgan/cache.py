@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+from typing import Optional, Tuple
+
+# bump whenever the layout of the database changes
+SCHEMA_VERSION = 1
+
+
+class HTTPCache:
+    """
+    HTTPCache is a small persistent cache of HTTP responses, backed by an
+    SQLite database. It stores the body of a response along with its ETag and
+    Last-Modified validators, so that subsequent runs of the mirrorer can issue
+    conditional requests and reuse the stored body when the server answers
+    with "304 Not Modified". Responses that carry no validators are not stored,
+    as there would be no way to revalidate them.
+
+    The cache can be shared between threads.
+    """
+
+    def __init__(self, path: str):
+        """
+        Object constructor. The database file is created if it does not
+        already exist.
+
+        Parameters:
+        -----------
+        path : str
+            Path to the SQLite database file.
+        """
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            # databases written with a different schema are discarded
+            (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+            if version != SCHEMA_VERSION:
+                self._conn.execute("DROP TABLE IF EXISTS responses")
+                self._conn.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body BLOB"
+                ")"
+            )
+
+    def get(self, url: str) -> Optional[Tuple[str, str, bytes]]:
+        """
+        Returns a tuple of ETag, Last-Modified and body for a cached URL, or
+        None if the URL is not cached. Either of the validators may be None.
+        """
+
+        with self._lock:
+            return self._conn.execute(
+                "SELECT etag, last_modified, body FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+
+    def put(self, url: str, etag: str, last_modified: str, body: bytes):
+        """
+        Stores a response for a URL, replacing any previously cached response.
+        """
+
+        if not etag and not last_modified:
+            return
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (url, etag, last_modified, body),
+            )
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+        """
+
+        with self._lock:
+            self._conn.close()
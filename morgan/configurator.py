@@ -1,5 +1,4 @@
 import argparse
-from collections import OrderedDict
 import configparser
 import os
 import platform
@@ -56,7 +55,7 @@ def generate_reqs(mode: str = ">="):
         for dist in metadata.distributions()
     }
     config = configparser.ConfigParser()
-    config["requirements"] = OrderedDict(sorted(requirements.items()))
+    config["requirements"] = dict(sorted(requirements.items()))
     config.write(sys.stdout)
 
 
@@ -53,6 +53,19 @@ class MetadataParser:
         Dependencies required to build the package.
     """
 
+    # one parser is created for every distribution file that is mirrored
+    __slots__ = (
+        "source_path",
+        "name",
+        "version",
+        "python_requirement",
+        "extras_provided",
+        "core_dependencies",
+        "optional_dependencies",
+        "build_dependencies",
+        "_metadata_file",
+    )
+
     def __init__(self, source_path: str):
         """
         Object constructor.
@@ -213,9 +226,9 @@ class MetadataParser:
         self.core_dependencies |= set([Requirement(dep) for dep in reqs])
 
     def _add_optional_requirements(self, extra, reqs):
-        if extra not in self.optional_dependencies:
-            self.optional_dependencies[extra] = set()
-        self.optional_dependencies[extra] |= set([Requirement(dep) for dep in reqs])
+        self.optional_dependencies.setdefault(extra, set()).update(
+            Requirement(dep) for dep in reqs
+        )
 
     def _parse_pyproject(self, fp):
         data = tomli.load(fp)
@@ -298,9 +311,7 @@ class MetadataParser:
                             break
 
                 if extra:
-                    if extra not in self.optional_dependencies:
-                        self.optional_dependencies[extra] = set()
-                    self.optional_dependencies[extra].add(req)
+                    self.optional_dependencies.setdefault(extra, set()).add(req)
                 else:
                     self.core_dependencies.add(req)
 
@@ -1,4 +1,5 @@
 import argparse
+import functools
 import html
 import http.server
 import json
@@ -11,9 +12,11 @@ PYPI_JSON_TYPE_V1 = "application/vnd.pypi.simple.v1+json"
 PYPI_JSON_TYPE_LT = "application/vnd.pypi.simple.latest+json"
 PYPI_HTML_TYPE_V1 = "application/vnd.pypi.simple.v1+html"
 GENL_HTML_TYPE = "text/html"
+DIST_EXTENSIONS = (".whl", ".zip", ".tar.gz")
 
 project_re = re.compile(r"/([^/]+)/")
 file_re = re.compile(r"/([^/]+)/([^/]+)")
+separators_re = re.compile(r"[-_.]+")
 index_path = os.getcwd()
 no_metadata = False
 
@@ -99,35 +102,39 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
         project = normalize(project)
 
         path = pathlib.Path(index_path, project)
-        if not path.exists() or not path.is_dir():
+        if not path.is_dir():
             self._serve_notfound("No such project {}".format(project))
             return
 
-        files = []
+        # list the directory once, so that hash and metadata files can be
+        # looked up by name rather than checked for on disk one by one
         with os.scandir(path) as it:
-            for entry in it:
-                if re.search(r"\.(whl|zip|tar\.gz)$", entry.name):
-                    file = {
-                        "filename": entry.name,
-                        "url": "/{}/{}".format(project, entry.name),
-                        "hashes": {},
-                    }
-
-                    # read file hash
-                    hashfile = path.joinpath("{}.hash".format(entry.name))
-                    if hashfile.exists():
-                        with open(hashfile, "r") as hf:
-                            data = hf.read().strip().split("=")
-                            file["hashes"][data[0]] = data[1]
-
-                    # do we have a metadata file?
-                    file["dist-info-metadata"] = (
-                        False
-                        if no_metadata
-                        else path.joinpath("{}.metadata".format(entry.name)).exists()
-                    )
+            filenames = {entry.name for entry in it}
+
+        files = []
+        for filename in filenames:
+            if filename.endswith(DIST_EXTENSIONS):
+                file = {
+                    "filename": filename,
+                    "url": "/{}/{}".format(project, filename),
+                    "hashes": {},
+                }
+
+                # read file hash
+                hashfile = "{}.hash".format(filename)
+                if hashfile in filenames:
+                    with open(path.joinpath(hashfile), "r") as hf:
+                        data = hf.read().strip().split("=")
+                        file["hashes"][data[0]] = data[1]
+
+                # do we have a metadata file?
+                file["dist-info-metadata"] = (
+                    False
+                    if no_metadata
+                    else "{}.metadata".format(filename) in filenames
+                )
 
-                    files.append(file)
+                files.append(file)
         files.sort(key=lambda file: file["filename"])
 
         if ct in [PYPI_JSON_TYPE_V1, PYPI_JSON_TYPE_LT]:
@@ -175,18 +182,18 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
         project = normalize(project)
 
         path = pathlib.Path(index_path, project, filename)
-        if not path.exists() or not path.is_file():
+        if not path.is_file():
             self._serve_notfound("No such project {}".format(project))
             return
 
-        if no_metadata and re.search(r"\.metadata$", filename):
+        if no_metadata and filename.endswith(".metadata"):
             self._serve_notfound("No such file {}".format(filename))
             return
 
         ct = "text/plain"
-        if re.search(r"\.(whl|zip)$", filename):
+        if filename.endswith((".whl", ".zip")):
             ct = "application/octet-stream"
-        elif re.search(r"\.tar\.gz$", filename):
+        elif filename.endswith(".tar.gz"):
             ct = "application/x-tar"
 
         self.send_response(200)
@@ -218,12 +225,14 @@ def run(
     ).serve_forever()
 
 
+@functools.lru_cache(maxsize=64)
 def parse_accept_header(header_val: str) -> str:
     """
     Parses an Accept HTTP header and returns a selected MIME type for the server
     to answer with, honoring priorities defined in the header value. If the
     header value is empty, or the topmost priority is */*, HTML will be returned
-    for backwards compatibility with PEP 503 clients.
+    for backwards compatibility with PEP 503 clients. Results are cached, as
+    clients send the same header with every request.
     """
 
     if not header_val:
@@ -277,7 +286,7 @@ def normalize(name):
     Normalize the name of a package as per PEP 503.
     """
 
-    return re.sub(r"[-_.]+", "-", name).lower()
+    return separators_re.sub("-", name).lower()
 
 
 def add_arguments(parser: argparse.ArgumentParser):
@@ -1,17 +1,37 @@
+import hashlib
 import re
 
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_version_dashes_re = re.compile(r"-[0-9].*-")
+_dash_to_dot = str.maketrans("-", ".")
+
 
 def to_single_dash(filename):
     "https://packaging.python.org/en/latest/specifications/version-specifiers/#version-specifiers"
 
     # selenium-2.0-dev-9429.tar.gz
-    m = re.search(r"-[0-9].*-", filename)
+    m = _version_dashes_re.search(filename)
     if m:
-        s2 = filename[m.start() + 1 :]
-        # 2.0-dev-9429.tar.gz
-        s2 = s2.replace("-dev-", ".dev")
-        # 2.0.dev9429.tar.gz
-        s2 = s2.replace("-", ".")
+        # 2.0-dev-9429.tar.gz -> 2.0.dev9429.tar.gz
+        s2 = filename[m.start() + 1 :].replace("-dev-", ".dev").translate(_dash_to_dot)
         filename = filename[: m.start() + 1] + s2
     return filename
     # selenium-2.0.dev9429.tar.gz
+
+
+def file_digest(filepath, hashalg):
+    """
+    Return the hex digest of a file's contents, computed with the named hashlib
+    algorithm. The file is hashed incrementally rather than read into memory
+    at once; on Python 3.11+ this is delegated to hashlib.file_digest.
+    """
+
+    with open(filepath, "rb") as fh:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(fh, hashalg).hexdigest()
+
+        digest = hashlib.new(hashalg)
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        return digest.hexdigest()
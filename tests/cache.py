@@ -0,0 +1,38 @@
+import morgan.cache
+from morgan.cache import HTTPCache
+
+
+def test_http_cache_roundtrip(tmp_path):
+    cache = HTTPCache(str(tmp_path / "cache.sqlite3"))
+    assert cache.get("https://example.com/a/") is None
+
+    cache.put("https://example.com/a/", '"abc"', None, b"body")
+    assert cache.get("https://example.com/a/") == ('"abc"', None, b"body")
+
+    cache.put("https://example.com/a/", None, "yesterday", b"newer")
+    assert cache.get("https://example.com/a/") == (None, "yesterday", b"newer")
+    cache.close()
+
+    # responses persist across instances
+    cache = HTTPCache(str(tmp_path / "cache.sqlite3"))
+    assert cache.get("https://example.com/a/") == (None, "yesterday", b"newer")
+    cache.close()
+
+
+def test_http_cache_skips_unvalidated_responses(tmp_path):
+    cache = HTTPCache(str(tmp_path / "cache.sqlite3"))
+    cache.put("https://example.com/b/", None, None, b"body")
+    assert cache.get("https://example.com/b/") is None
+    cache.close()
+
+
+def test_http_cache_discards_other_schema_versions(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = HTTPCache(path)
+    cache.put("https://example.com/c/", '"abc"', None, b"body")
+    cache.close()
+
+    monkeypatch.setattr(morgan.cache, "SCHEMA_VERSION", morgan.cache.SCHEMA_VERSION + 1)
+    cache = HTTPCache(path)
+    assert cache.get("https://example.com/c/") is None
+    cache.close()
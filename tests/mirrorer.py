@@ -0,0 +1,290 @@
+import argparse
+import hashlib
+import http.server
+import json
+import threading
+
+import pytest
+
+import morgan
+from morgan.cache import HTTPCache
+
+
+def project_page(*filenames):
+    return json.dumps(
+        {
+            "meta": {"api-version": "1.0"},
+            "files": [{"filename": filename} for filename in filenames],
+        }
+    ).encode("utf-8")
+
+
+class IndexHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        etag = self.headers.get("If-None-Match")
+        self.server.requests.append((self.path, etag))
+
+        page = self.server.pages.get(self.path)
+        if page is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        (body, page_etag) = page
+        if page_etag and etag == page_etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        if page_etag:
+            self.send_header("ETag", page_etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class IndexServer(http.server.ThreadingHTTPServer):
+    # prefetching opens many connections at once
+    request_queue_size = 64
+
+
+@pytest.fixture
+def index_server():
+    srv = IndexServer(("127.0.0.1", 0), IndexHandler)
+    srv.pages = {}
+    srv.requests = []
+    thread = threading.Thread(
+        target=srv.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def clear_proxies(monkeypatch):
+    for var in ("http_proxy", "https_proxy", "all_proxy", "no_proxy"):
+        monkeypatch.delenv(var, raising=False)
+        monkeypatch.delenv(var.upper(), raising=False)
+
+
+def make_mirrorer(tmp_path, index_url):
+    config = tmp_path / "morgan.ini"
+    config.write_text("[requirements]\nfoo =\nbar = >=1\n")
+    return morgan.Mirrorer(
+        argparse.Namespace(
+            index_path=str(tmp_path), index_url=index_url, config=str(config)
+        )
+    )
+
+
+@pytest.fixture(params=["urllib", "urllib3"])
+def mirrorer(request, tmp_path, index_server, monkeypatch):
+    if request.param == "urllib3":
+        pytest.importorskip("urllib3")
+    else:
+        monkeypatch.setattr(morgan, "urllib3", None)
+    clear_proxies(monkeypatch)
+
+    m = make_mirrorer(tmp_path, "http://127.0.0.1:{}/".format(index_server.server_port))
+    yield m
+    m.close()
+
+
+def test_fetch_project_revalidates_cached_page(mirrorer, index_server, tmp_path):
+    index_server.pages["/foo/"] = (project_page("foo-1.0.tar.gz"), '"v1"')
+    mirrorer.http_cache = HTTPCache(str(tmp_path / "cache.sqlite3"))
+
+    for _ in range(2):
+        data = json.loads(mirrorer._fetch_project("foo"))
+        assert data["files"] == [{"filename": "foo-1.0.tar.gz"}]
+
+    assert index_server.requests == [("/foo/", None), ("/foo/", '"v1"')]
+
+
+def test_take_project_drops_prefetched_pages(mirrorer, index_server):
+    index_server.pages["/foo/"] = (project_page(), None)
+    index_server.pages["/bar/"] = (project_page(), None)
+
+    mirrorer._prefetch_projects(["foo", "bar"])
+    assert sorted(mirrorer._project_pages) == ["bar", "foo"]
+
+    mirrorer._take_project("foo")
+    assert sorted(mirrorer._project_pages) == ["bar"]
+    assert len(index_server.requests) == 2
+
+    # a page that was already taken is fetched again
+    mirrorer._take_project("foo")
+    assert len(index_server.requests) == 3
+
+
+def test_prefetch_projects_fetches_each_page_once(mirrorer, index_server):
+    names = ["pkg{}".format(i) for i in range(2 * morgan.PREFETCH_WORKERS)]
+    for name in names:
+        index_server.pages["/{}/".format(name)] = (
+            project_page(name + "-1.0.zip"),
+            None,
+        )
+
+    mirrorer._prefetch_projects(names)
+    mirrorer._prefetch_projects(names)
+
+    assert sorted(path for (path, _) in index_server.requests) == sorted(
+        "/{}/".format(name) for name in names
+    )
+    for name in names:
+        data = mirrorer._take_project(name)
+        assert data["files"] == [{"filename": name + "-1.0.zip"}]
+    assert mirrorer._project_pages == {}
+    assert len(index_server.requests) == len(names)
+
+
+def test_prefetch_projects_records_failures(mirrorer, index_server):
+    index_server.pages["/foo/"] = (project_page(), None)
+
+    mirrorer._prefetch_projects(["foo", "missing"])
+    assert len(index_server.requests) == 2
+
+    with pytest.raises(morgan.urllib.error.HTTPError) as excinfo:
+        mirrorer._take_project("missing")
+    assert excinfo.value.code == 404
+    mirrorer._take_project("foo")
+
+    # the failed page was not requested a second time
+    assert len(index_server.requests) == 2
+
+
+@pytest.mark.parametrize(
+    "platform",
+    [
+        "manylinux_2_17_x86_64",
+        "manylinux2014_x86_64",
+        "linux_x86_64",
+        "LINUX_X86_64",
+        "linux_i686",
+        "win_amd64",
+        "macosx_10_9_x86_64",
+    ],
+)
+def test_matches_platforms(tmp_path, platform):
+    config = tmp_path / "morgan.ini"
+    config.write_text(
+        "[env.edge]\n"
+        "python_version = 3.11\n"
+        "sys_platform = linux\n"
+        "platform_machine = x86_64\n"
+        "platform_tag = (?i)linux-x86_64\n"
+        "[env.mac]\n"
+        "python_version = 3.11\n"
+        "sys_platform = darwin\n"
+        "platform_machine = arm64\n"
+        "[requirements]\n"
+    )
+    m = morgan.Mirrorer(
+        argparse.Namespace(
+            index_path=str(tmp_path), index_url="http://localhost/", config=str(config)
+        )
+    )
+
+    expected = False
+    for platformre in m._supported_platforms:
+        if platformre.fullmatch(platform):
+            expected = True
+            break
+
+    # twice, to go through the memoized result as well
+    assert m._matches_platforms(platform) == expected
+    assert m._matches_platforms(platform) == expected
+
+
+def test_get_honors_proxy_settings(tmp_path, index_server, monkeypatch):
+    pytest.importorskip("urllib3")
+    clear_proxies(monkeypatch)
+    monkeypatch.setenv(
+        "http_proxy", "http://127.0.0.1:{}".format(index_server.server_port)
+    )
+    index_server.pages["http://pypi.invalid/foo/"] = (project_page(), None)
+
+    m = make_mirrorer(tmp_path, "http://pypi.invalid/")
+    try:
+        assert m._take_project("foo")["files"] == []
+    finally:
+        m.close()
+
+    # the request went through the proxy, which got the absolute URL
+    assert index_server.requests == [("http://pypi.invalid/foo/", None)]
+
+
+def test_prewarm_fetches_configured_requirements(mirrorer, index_server):
+    index_server.pages["/foo/"] = (project_page("foo-1.0.zip"), None)
+    index_server.pages["/bar/"] = (project_page("bar-1.0.zip"), None)
+
+    mirrorer.prewarm()
+    assert sorted(path for (path, _) in index_server.requests) == ["/bar/", "/foo/"]
+
+    assert mirrorer._take_project("foo")["files"] == [{"filename": "foo-1.0.zip"}]
+    assert mirrorer._take_project("bar")["files"] == [{"filename": "bar-1.0.zip"}]
+    assert mirrorer._project_pages == {}
+    assert len(index_server.requests) == 2
+
+
+def test_mirror_skips_prefetching_processed_dependencies(
+    mirrorer, index_server, monkeypatch
+):
+    for name in ("bar", "baz", "qux"):
+        index_server.pages["/{}/".format(name)] = (project_page(), None)
+
+    def fake_mirror(requirement, required_by=None):
+        if required_by is not None:
+            return None
+        return {
+            name: {
+                "requirement": morgan.parse_requirement(name),
+                "required_by": requirement,
+            }
+            for name in ("bar", "baz", "qux")
+        }
+
+    monkeypatch.setattr(mirrorer, "_mirror", fake_mirror)
+    mirrorer._processed_pkgs["bar"] = True
+    mirrorer.mirror("foo")
+
+    assert sorted(path for (path, _) in index_server.requests) == ["/baz/", "/qux/"]
+
+
+def test_download_file_removes_mismatching_file(mirrorer, index_server, tmp_path):
+    index_server.pages["/files/foo-1.0.zip"] = (b"tampered", None)
+    fileinfo = {
+        "filename": "foo-1.0.zip",
+        "url": "http://127.0.0.1:{}/files/foo-1.0.zip".format(index_server.server_port),
+        "hashes": {"sha256": hashlib.sha256(b"original").hexdigest()},
+    }
+    target = tmp_path / "foo" / "foo-1.0.zip"
+
+    assert not mirrorer._download_file(fileinfo, str(target), "sha256")
+    assert not target.exists()
+    assert not (tmp_path / "foo" / "foo-1.0.zip.hash").exists()
+
+
+def test_download_file_keeps_matching_file(mirrorer, index_server, tmp_path):
+    index_server.pages["/files/foo-1.0.zip"] = (b"original", None)
+    fileinfo = {
+        "filename": "foo-1.0.zip",
+        "url": "http://127.0.0.1:{}/files/foo-1.0.zip".format(index_server.server_port),
+        "hashes": {"sha256": hashlib.sha256(b"original").hexdigest()},
+    }
+    target = tmp_path / "foo" / "foo-1.0.zip"
+
+    assert mirrorer._download_file(fileinfo, str(target), "sha256")
+    assert target.read_bytes() == b"original"
+    assert (tmp_path / "foo" / "foo-1.0.zip.hash").read_text() == (
+        "sha256={}".format(fileinfo["hashes"]["sha256"])
+    )
+
+    # an intact file is not downloaded again
+    assert mirrorer._download_file(fileinfo, str(target), "sha256")
+    assert len(index_server.requests) == 1
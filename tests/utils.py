@@ -0,0 +1,43 @@
+import hashlib
+
+import pytest
+
+from morgan import utils
+
+
+@pytest.mark.parametrize("hashalg", ["sha256", "md5"])
+@pytest.mark.parametrize(
+    "contents", [b"", b"morgan", b"x" * (utils.HASH_CHUNK_SIZE + 1)]
+)
+def test_file_digest(tmp_path, hashalg, contents):
+    filepath = tmp_path / "file.tar.gz"
+    filepath.write_bytes(contents)
+    assert utils.file_digest(str(filepath), hashalg) == (
+        hashlib.new(hashalg, contents).hexdigest()
+    )
+
+
+def test_file_digest_without_hashlib_file_digest(tmp_path, monkeypatch):
+    monkeypatch.delattr(hashlib, "file_digest", raising=False)
+    contents = b"x" * (2 * utils.HASH_CHUNK_SIZE + 7)
+    filepath = tmp_path / "file.whl"
+    filepath.write_bytes(contents)
+    assert utils.file_digest(str(filepath), "sha256") == (
+        hashlib.sha256(contents).hexdigest()
+    )
+
+
+@pytest.mark.parametrize(
+    "filename, exp_filename",
+    [
+        ("selenium-2.0-dev-9429.tar.gz", "selenium-2.0.dev9429.tar.gz"),
+        (
+            "expandvars-0.6.0-macosx-10.15-x86_64.tar.gz",
+            "expandvars-0.6.0.macosx.10.15.x86_64.tar.gz",
+        ),
+        ("requests-2.31.0.tar.gz", "requests-2.31.0.tar.gz"),
+        ("zope.interface-6.0.zip", "zope.interface-6.0.zip"),
+    ],
+)
+def test_to_single_dash(filename, exp_filename):
+    assert utils.to_single_dash(filename) == exp_filename